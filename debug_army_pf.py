@@ -1,35 +1,90 @@
-import requests
-from bs4 import BeautifulSoup
+import argparse
+from datetime import timedelta
+
+import requests_cache
+from requests_cache import EXPIRE_IMMEDIATELY
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE_URL = "https://www.ourlads.com"
 PF_URL = "https://www.ourlads.com/ncaa-football-depth-charts/pfdepthchart/army/90038"
 
+# Ask for compressed pages. Brotli is only advertised when the brotli
+# package is installed, since urllib3 needs it to decode "br" responses.
+try:
+    import brotli  # noqa: F401
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+else:
+    ACCEPT_ENCODING = "gzip, deflate, br"
+
 HEADERS = {
     "User-Agent": (
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
         "AppleWebKit/537.36 (KHTML, like Gecko) "
         "Chrome/125.0.0.0 Safari/537.36"
-    )
+    ),
+    "Accept-Encoding": ACCEPT_ENCODING,
 }
 
+SESSION = requests_cache.CachedSession(
+    "ourlads_cache",
+    expire_after=timedelta(hours=6),
+    allowable_codes=(200, 404),
+)
+SESSION.headers.update(HEADERS)
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        # Back off only when the server asks us to (429/503, honouring any
+        # Retry-After header) or hiccups; no fixed sleep between requests.
+        max_retries=Retry(
+            total=5,
+            backoff_factor=1.0,
+            status_forcelist=[429, 502, 503, 504],
+            respect_retry_after_header=True,
+        ),
+    ),
+)
+
 def main():
-    resp = requests.get(PF_URL, headers=HEADERS, timeout=20)
-    # Force UTF-8 just in case
-    resp.encoding = "utf-8"
+    parser = argparse.ArgumentParser(description="Dump the Army PF depth chart page.")
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="revalidate the cached page with the server before using it",
+    )
+    args = parser.parse_args()
+
+    if args.refresh:
+        # Mark everything stale rather than deleting it: pages that carry an
+        # ETag / Last-Modified are revalidated with a conditional GET and a
+        # 304 reuses the stored body; anything else is downloaded again.
+        SESSION.cache.reset_expiration(EXPIRE_IMMEDIATELY)
+
+    resp = SESSION.get(PF_URL, timeout=20)
 
     print("HTTP status:", resp.status_code)
-    print("First 500 chars of raw HTML:\n")
-    print(resp.text[:500])
+    print("First 500 bytes of raw HTML:\n")
+    print(resp.content[:500].decode("utf-8", errors="replace"))
     print("\n----------------------------------------\n")
 
-    soup = BeautifulSoup(resp.text, "html.parser")
-    text = soup.get_text("\n")
-    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    # Only look at table rows; the depth chart lives in <table> markup, so
+    # there is no need to build or flatten the rest of the page.
+    soup = BeautifulSoup(resp.content, "lxml", parse_only=SoupStrainer("table"))
+    rows = []
+    for row in soup.select("table tr"):
+        cells = [c.get_text(strip=True) for c in row.find_all(["th", "td"])]
+        if any(cells):
+            rows.append(cells)
 
-    print(f"Total text lines: {len(lines)}\n")
-    print("First 40 lines (repr so we see weird chars):\n")
-    for i, line in enumerate(lines[:40]):
-        print(i, repr(line))
+    print(f"Total table rows: {len(rows)}\n")
+    print("First 40 rows (repr so we see weird chars):\n")
+    for i, cells in enumerate(rows[:40]):
+        print(i, repr(cells))
 
 if __name__ == "__main__":
     main()
@@ -1,27 +1,134 @@
-import time
+import argparse
 import csv
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
 from urllib.parse import urljoin, urlparse, parse_qs
 
-import requests
-from bs4 import BeautifulSoup
+import requests_cache
+from requests_cache import EXPIRE_IMMEDIATELY
+from lxml import etree
+from selectolax.lexbor import LexborHTMLParser, LexborNode
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE_URL = "https://www.ourlads.com"
 INDEX_URL = "https://www.ourlads.com/ncaa-football-depth-charts/"
 
+# Ask for compressed pages. Brotli is only advertised when the brotli
+# package is installed, since urllib3 needs it to decode "br" responses.
+try:
+    import brotli  # noqa: F401
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+else:
+    ACCEPT_ENCODING = "gzip, deflate, br"
+
 HEADERS = {
     "User-Agent": (
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
         "AppleWebKit/537.36 (KHTML, like Gecko) "
         "Chrome/125.0.0.0 Safari/537.36"
-    )
+    ),
+    "Accept-Encoding": ACCEPT_ENCODING,
 }
 
+# Fast paths for to_canonical_depth_url: 'depth-chart.aspx?s=<slug>&id=<id>'
+# index links, and links that are already '/depth-chart/<slug>/<id>'.
+_ASPX_RE = re.compile(r"depth-chart\.aspx\?(?:[^#]*?&)?s=([\w-]+)&(?:[^#]*?&)?id=(\d+)(?:[&#]|$)")
+_PATH_RE = re.compile(r"/depth-chart/[\w-]+/\d+/?(?:[?#]|$)")
+
+# Column order of the output CSV and of every record tuple we build.
+FIELDNAMES = ("team", "unit_type", "position", "depth", "jersey", "player")
 
-def get_soup(url: str) -> BeautifulSoup:
-    """Download a page and return a BeautifulSoup object."""
-    resp = requests.get(url, headers=HEADERS, timeout=20)
+# Lower-cased heading keyword -> unit_type label, checked in this order.
+SECTION_MAP = {
+    "offense": "Offense",
+    "defense": "Defense",
+    "special teams": "Special Teams",
+    "special team": "Special Teams",
+}
+
+# How many team pages to download at once. Keep this at or below the
+# adapter's pool_maxsize so every worker gets a pooled connection.
+MAX_WORKERS = 8
+
+# One shared session so the index page and every team page reuse the same
+# keep-alive connection instead of paying a new TCP + TLS handshake each time.
+# Responses are also cached on disk (ourlads_cache.sqlite), so re-runs within
+# the expiry window skip the network entirely. 404s are cached too, so dead
+# team links are not re-requested on every run. Once an entry expires (or
+# with --refresh), requests-cache sends If-None-Match / If-Modified-Since
+# from the stored ETag / Last-Modified, so unchanged pages come back as a
+# bodiless 304 and the cached copy is reused.
+SESSION = requests_cache.CachedSession(
+    "ourlads_cache",
+    expire_after=timedelta(hours=6),
+    allowable_codes=(200, 404),
+)
+SESSION.headers.update(HEADERS)
+SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        # Back off only when the server asks us to (429/503, honouring any
+        # Retry-After header) or hiccups; no fixed sleep between requests.
+        max_retries=Retry(
+            total=5,
+            backoff_factor=1.0,
+            status_forcelist=[429, 502, 503, 504],
+            respect_retry_after_header=True,
+        ),
+    ),
+)
+
+
+def fetch_html(url: str) -> bytes:
+    """
+    Download a page and return its raw HTML bytes.
+
+    We hand bytes (not resp.text) to the parser so it can sniff the
+    encoding itself instead of us decoding in Python first.
+    """
+    resp = SESSION.get(url, timeout=20)
     resp.raise_for_status()
-    return BeautifulSoup(resp.text, "html.parser")
+    return resp.content
+
+
+def iter_links(url: str):
+    """
+    Stream a page and yield (text, href) for every <a> tag on it.
+
+    The body is fed to lxml's incremental HTML parser chunk by chunk as it
+    arrives, and each element is cleared once we are done with it, so the
+    page is never held in memory as a full tree.
+    """
+    parser = etree.HTMLPullParser(events=("start", "end"))
+    open_links = 0
+
+    def drain():
+        nonlocal open_links
+        for event, el in parser.read_events():
+            if el.tag == "a":
+                if event == "start":
+                    open_links += 1
+                    continue
+                open_links -= 1
+                text = "".join(t.strip() for t in el.itertext())
+                yield text, el.get("href")
+            # Children of an open <a> are kept until the link itself ends.
+            if event == "end" and not open_links:
+                el.clear()
+
+    with SESSION.get(url, timeout=20, stream=True) as resp:
+        resp.raise_for_status()
+        for chunk in resp.iter_content(chunk_size=16384):
+            parser.feed(chunk)
+            yield from drain()
+
+    parser.close()
+    yield from drain()
 
 
 def get_team_depth_chart_urls():
@@ -29,19 +136,12 @@ def get_team_depth_chart_urls():
     From the main NCAAF depth chart index page, collect all 'Depth Chart' links.
     We scrape every team.
     """
-    soup = get_soup(INDEX_URL)
-
-    links = []
-    for a in soup.find_all("a"):
-        text = a.get_text(strip=True)
-        href = a.get("href")
-        if not href:
-            continue
-        if text == "Depth Chart":
-            full_url = urljoin(INDEX_URL, href)
-            links.append(full_url)
+    seen = set()
+    for text, href in iter_links(INDEX_URL):
+        if href and text == "Depth Chart":
+            seen.add(urljoin(INDEX_URL, href))
 
-    links = sorted(set(links))
+    links = sorted(seen)
     print(f"Found {len(links)} team depth chart pages on index")
     return links
 
@@ -51,7 +151,17 @@ def to_canonical_depth_url(team_url: str) -> str:
     Convert 'depth-chart.aspx?s=air-force&id=89877' into
     '.../ncaa-football-depth-charts/depth-chart/air-force/89877'
     so we always hit the main depth chart page.
+
+    Index links are very regular, so a precompiled regex handles them; the
+    urlparse/parse_qs path is only a fallback for anything unusual.
     """
+    m = _ASPX_RE.search(team_url)
+    if m:
+        slug, tid = m.groups()
+        return f"{BASE_URL}/ncaa-football-depth-charts/depth-chart/{slug}/{tid}"
+    if _PATH_RE.search(team_url):
+        return team_url
+
     parsed = urlparse(team_url)
     path = parsed.path
     query = parsed.query
@@ -66,18 +176,19 @@ def to_canonical_depth_url(team_url: str) -> str:
     return team_url
 
 
-def get_team_name(soup: BeautifulSoup) -> str:
+def get_team_name(tree: LexborHTMLParser) -> str:
     """
     Get team name from the main heading that contains 'Depth Chart',
     for example 'Air Force Falcons Depth Chart' -> 'Air Force Falcons'.
     """
-    for h in soup.find_all(["h1", "h2", "h3"]):
-        text = h.get_text(strip=True)
+    for h in tree.css("h1, h2, h3"):
+        text = h.text(strip=True)
         if "Depth Chart" in text:
             return text.replace("Depth Chart", "").strip()
 
-    if soup.title and soup.title.string:
-        text = soup.title.string
+    title = tree.css_first("title")
+    if title is not None and title.text():
+        text = title.text()
         if "Depth Chart" in text:
             return text.replace("Depth Chart", "").strip()
         return text.strip()
@@ -85,37 +196,55 @@ def get_team_name(soup: BeautifulSoup) -> str:
     return "Unknown"
 
 
-def find_section_for_table(table: BeautifulSoup) -> str:
+def section_from_heading(heading: LexborNode):
     """
-    Walk backwards from the table to find the nearest header that names the section.
+    Return 'Offense', 'Defense' or 'Special Teams' if the heading names a
+    section, otherwise None.
+    """
+    text = heading.text(strip=True).lower()
+
+    # Bare 'Offense' / 'Defense' / 'Special Teams' headings hit the dict
+    # directly; longer headings fall back to a keyword scan.
+    section = SECTION_MAP.get(text)
+    if section:
+        return section
+    for keyword, section in SECTION_MAP.items():
+        if keyword in text:
+            return section
+    return None
+
 
-    We look for heading tags with text containing 'Offense', 'Defense', or 'Special Teams'.
+def find_tables_with_sections(tree: LexborHTMLParser):
     """
-    section = "Unknown"
-    for el in table.find_all_previous():
-        if el.name in ("h1", "h2", "h3", "h4"):
-            text = el.get_text(strip=True).lower()
-            if "offense" in text:
-                section = "Offense"
-                break
-            if "defense" in text:
-                section = "Defense"
-                break
-            if "special teams" in text or "special team" in text:
-                section = "Special Teams"
-                break
-    return section
-
-
-def is_depth_chart_table(table: BeautifulSoup) -> bool:
+    Walk the document once, in order, and return (table, section) pairs.
+
+    Sections appear in document order (Offense -> Defense -> Special Teams),
+    so we just remember the last section heading we passed and tag each
+    table with it. Tables before any section heading are 'Unknown'.
+    """
+    current_section = "Unknown"
+    tables = []
+
+    for el in tree.root.traverse():
+        if el.tag in ("h1", "h2", "h3", "h4"):
+            section = section_from_heading(el)
+            if section:
+                current_section = section
+        elif el.tag == "table":
+            tables.append((el, current_section))
+
+    return tables
+
+
+def is_depth_chart_table(table: LexborNode) -> bool:
     """
     Heuristic: a depth chart table has header cells with 'Pos' and 'Player 1'.
     """
-    header_row = table.find("tr")
-    if not header_row:
+    header_row = table.css_first("tr")
+    if header_row is None:
         return False
 
-    header_text = " ".join(th.get_text(strip=True) for th in header_row.find_all(["th", "td"]))
+    header_text = " ".join(th.text(strip=True) for th in header_row.css("th, td"))
     header_text_low = header_text.lower()
     return ("pos" in header_text_low) and ("player 1" in header_text_low)
 
@@ -132,16 +261,19 @@ def extract_last_name(full_name: str) -> str:
     if not full_name:
         return ""
 
-    if "," in full_name:
-        return full_name.split(",")[0].strip()
+    # partition / rsplit(None, 1) stop at the first comma / last space
+    # instead of building a list of every piece of the name.
+    last, comma, _ = full_name.partition(",")
+    if comma:
+        return last.strip()
 
-    parts = full_name.split()
-    return parts[-1].strip() if parts else ""
+    return full_name.rsplit(None, 1)[-1]
 
 
-def parse_depth_table(table: BeautifulSoup, team_name: str, unit_type: str):
+def parse_depth_table(table: LexborNode, team_name: str, unit_type: str):
     """
-    Parse a single depth chart table and return starter records.
+    Parse a single depth chart table and return starter records as tuples
+    in FIELDNAMES order.
 
     We assume columns roughly like:
       Pos | No. | Player 1 | No | Player 2 | ...
@@ -153,101 +285,120 @@ def parse_depth_table(table: BeautifulSoup, team_name: str, unit_type: str):
     """
     records = []
 
-    rows = table.find_all("tr")
-    if not rows or len(rows) < 2:
+    rows = table.css("tr")
+    if len(rows) < 2:
         return records
 
     for row in rows[1:]:
-        cells = row.find_all("td")
-        if not cells:
+        # Check the cell count first: it is a plain length test, and rows
+        # without Pos / No. / Player 1 cells never need their text read.
+        cells = row.css("td")
+        if len(cells) < 3:
             continue
 
-        pos = cells[0].get_text(strip=True)
+        pos = cells[0].text(strip=True)
         if not pos or pos.lower() == "pos":
             continue
 
-        if len(cells) < 3:
-            continue
-
-        jersey = cells[1].get_text(strip=True)
-        full_player = cells[2].get_text(strip=True)
+        jersey = cells[1].text(strip=True)
+        full_player = cells[2].text(strip=True)
 
         if not jersey and not full_player:
             continue
 
         last_name = extract_last_name(full_player)
 
-        records.append(
-            {
-                "team": team_name,
-                "unit_type": unit_type,
-                "position": pos,
-                "depth": 1,          # starter
-                "jersey": jersey,
-                "player": last_name,  # only last name
-            }
-        )
+        # Same order as FIELDNAMES; depth is always 1 (starter) and player
+        # is the last name only.
+        records.append((team_name, unit_type, pos, 1, jersey, last_name))
 
     return records
 
 
-def parse_team_depth_chart(team_url: str):
-    """
-    For a given team, go to the main depth chart page and parse the
-    Offense / Defense / Special Teams tables, starters only.
+def fetch_team_page(team_url: str) -> bytes:
     """
-    print(f"\nScraping team index URL: {team_url}")
-    depth_url = to_canonical_depth_url(team_url)
-    print(f"  canonical depth chart URL: {depth_url}")
+    Download the main depth chart page for a team.
 
-    soup = get_soup(depth_url)
-    team_name = get_team_name(soup)
-    print(f"  detected team name: {team_name}")
-
-    all_records = []
+    Runs on a worker thread, so it only does network I/O.
+    """
+    return fetch_html(to_canonical_depth_url(team_url))
 
-    tables = soup.find_all("table")
-    print(f"  found {len(tables)} tables on page")
 
-    for idx, table in enumerate(tables):
-        if not is_depth_chart_table(table):
-            continue
+def parse_team_depth_chart(html: bytes):
+    """
+    Parse the Offense / Defense / Special Teams tables from a team's main
+    depth chart page, starters only.
 
-        unit_type = find_section_for_table(table)
-        print(f"  parsing table {idx} as {unit_type}")
+    Returns (team_name, records). This runs in a worker process, so it takes
+    raw HTML bytes, returns plain tuples and leaves printing to main().
+    """
+    tree = LexborHTMLParser(html)
+    team_name = get_team_name(tree)
 
-        table_records = parse_depth_table(table, team_name, unit_type)
-        print(f"    parsed {len(table_records)} starter records from this table")
-        all_records.extend(table_records)
+    all_records = []
+    for table, unit_type in find_tables_with_sections(tree):
+        if is_depth_chart_table(table):
+            all_records.extend(parse_depth_table(table, team_name, unit_type))
 
-    print(f"  total {len(all_records)} starter records for this team")
-    return all_records
+    return team_name, all_records
 
 
 def main():
-    team_urls = get_team_depth_chart_urls()
+    parser = argparse.ArgumentParser(description="Scrape NCAAF starters from ourlads.com depth charts.")
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="revalidate every cached page with the server before using it",
+    )
+    args = parser.parse_args()
 
-    all_records = []
+    if args.refresh:
+        # Mark everything stale rather than deleting it: pages that carry an
+        # ETag / Last-Modified are revalidated with a conditional GET and a
+        # 304 reuses the stored body; anything else is downloaded again.
+        SESSION.cache.reset_expiration(EXPIRE_IMMEDIATELY)
 
-    for idx, url in enumerate(team_urls, start=1):
-        print(f"\n=== Team {idx} of {len(team_urls)} ===")
-        try:
-            team_records = parse_team_depth_chart(url)
-            all_records.extend(team_records)
-        except Exception as e:
-            print(f"ERROR on {url}: {e}")
-        time.sleep(1)  # be polite to the site
+    team_urls = get_team_depth_chart_urls()
 
     output_file = "ncaaf_depth_charts_starters_only_tables.csv"
-    fieldnames = ["team", "unit_type", "position", "depth", "jersey", "player"]
+    total_rows = 0
 
+    # Write each team's rows as soon as they are parsed, so nothing piles up
+    # in memory and a crash part-way through still leaves usable output.
     with open(output_file, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for rec in all_records:
-            writer.writerow(rec)
-
-    print(f"\nDone. Saved {len(all_records)} rows to {output_file}")
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+
+        # Download pages on threads and parse them on every core. Each fetch
+        # thread hands its page to the process pool and waits for the
+        # records, so only bytes and tuples cross the process boundary and
+        # results still come back in index order.
+        with ProcessPoolExecutor() as parse_pool, ThreadPoolExecutor(max_workers=MAX_WORKERS) as fetch_pool:
+
+            def fetch_and_parse(team_url):
+                html = fetch_team_page(team_url)
+                return parse_pool.submit(parse_team_depth_chart, html).result()
+
+            futures = [fetch_pool.submit(fetch_and_parse, url) for url in team_urls]
+
+            for idx, (url, future) in enumerate(zip(team_urls, futures), start=1):
+                print(f"\n=== Team {idx} of {len(team_urls)} ===")
+                print(f"Scraping team index URL: {url}")
+                print(f"  canonical depth chart URL: {to_canonical_depth_url(url)}")
+                try:
+                    team_name, team_records = future.result()
+                except Exception as e:
+                    print(f"ERROR on {url}: {e}")
+                    continue
+
+                print(f"  detected team name: {team_name}")
+                print(f"  total {len(team_records)} starter records for this team")
+
+                writer.writerows(team_records)
+                f.flush()
+                total_rows += len(team_records)
+
+    print(f"\nDone. Saved {total_rows} rows to {output_file}")
 
 
 if __name__ == "__main__":